@@ -0,0 +1,56 @@
+# backend/cache.py
+
+import asyncio
+import functools
+import inspect
+from typing import Callable
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+
+
+def async_ttl_cache(maxsize: int = 64, ttl: float = 900, should_cache: Callable = bool):
+    """Cache coroutine results per normalized arguments for `ttl` seconds.
+
+    Concurrent misses on the same key wait on one lock, so only a single
+    upstream call is made. Results failing `should_cache` (by default, empty
+    results from failed fetches) are returned but not stored.
+    """
+
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        locks = {}
+        signature = inspect.signature(func)
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return hashkey(*bound.args, **bound.kwargs)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            try:
+                return cache[key]
+            except KeyError:
+                pass
+
+            lock = locks.setdefault(key, asyncio.Lock())
+            try:
+                async with lock:
+                    try:
+                        return cache[key]
+                    except KeyError:
+                        pass
+
+                    result = await func(*args, **kwargs)
+                    if should_cache(result):
+                        cache[key] = result
+                    return result
+            finally:
+                if locks.get(key) is lock and not lock.locked():
+                    del locks[key]
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
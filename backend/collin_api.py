@@ -1,9 +1,13 @@
-import requests
+import httpx
 import pandas as pd
 from typing import List, Dict, Optional
 from datetime import datetime
 import logging
 
+import http_client
+import workers
+from cache import async_ttl_cache
+
 logger = logging.getLogger(__name__)
 
 class CollinRealEstateAPI:
@@ -18,14 +22,13 @@ class CollinRealEstateAPI:
         "violations": "b4k4-adkb.json"   # Code Violations
     }
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Austin-Real-Estate-Dashboard/1.0'
-        })
+    HEADERS = {
+        'User-Agent': 'Austin-Real-Estate-Dashboard/1.0'
+    }
     
-    def get_properties(self, limit: int = 100, zip_code: Optional[str] = None, 
-                      min_value: Optional[float] = None) -> List[Dict]:
+    @async_ttl_cache(maxsize=64, ttl=900)
+    async def get_properties(self, limit: int = 100, zip_code: Optional[str] = None, 
+                             min_value: Optional[float] = None) -> List[Dict]:
         """Fetch Austin property appraisal data"""
         
         url = f"{self.BASE_URL}/{self.ENDPOINTS['properties']}"
@@ -35,71 +38,79 @@ class CollinRealEstateAPI:
         if zip_code:
             params["postal_code"] = zip_code
         
+        # Cast before templating so only a number can reach the SoQL clause
         if min_value:
-            params["$where"] = f"appraised_total_value > {min_value}"
+            params["$where"] = f"appraised_total_value > {float(min_value)}"
         
         try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
+            raw_data = await http_client.get_json(url, params=params, headers=self.HEADERS)
             
-            raw_data = response.json()
-            print("RAW RESPONSE COUNT:", len(raw_data))
-            print("SAMPLE:", raw_data[:2])
-            return self._clean_property_data(raw_data)
+            logger.debug("raw property rows: %d", len(raw_data))
+            return await workers.run_cpu(self._clean_property_data, raw_data)
             
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to fetch properties: {e}")
             return []
     
-    def get_market_summary(self) -> Dict:
+    # Failures come back as {"error": ...}; don't serve those for the whole TTL
+    @async_ttl_cache(maxsize=64, ttl=900, should_cache=lambda r: r and "error" not in r)
+    async def get_market_summary(self) -> Dict:
         """Get market-wide statistics"""
         
-        # Fetch larger dataset for analysis
-        properties = self.get_properties(limit=5000)
+        # Aggregate server-side: one summary row instead of thousands of records
+        params = {
+            "$select": (
+                "avg(prevvalmarket) AS avg_value, median(prevvalmarket) AS median_value, "
+                "min(prevvalmarket) AS min_value, max(prevvalmarket) AS max_value, count(*) AS n"
+            ),
+            "$where": "prevvalmarket > 0"
+        }
+        rows = await self._query("market summary", params)
         
-        if not properties:
+        if not rows or not int(rows[0].get("n") or 0):
             return {"error": "No data available"}
         
-        df = pd.DataFrame(properties)
-        
-        # Calculate key metrics
+        row = rows[0]
         summary = {
-            "total_properties": len(df),
-            "average_value": round(df['appraised_value'].mean(), 2),
-            "median_value": round(df['appraised_value'].median(), 2),
-            "min_value": round(df['appraised_value'].min(), 2),
-            "max_value": round(df['appraised_value'].max(), 2),
+            "total_properties": int(row["n"]),
+            "average_value": self._round(row.get("avg_value")),
+            "median_value": self._round(row.get("median_value")),
+            "min_value": self._round(row.get("min_value")),
+            "max_value": self._round(row.get("max_value")),
             "last_updated": datetime.now().isoformat()
         }
         
         return summary
     
-    def get_zip_analysis(self) -> List[Dict]:
+    @async_ttl_cache(maxsize=64, ttl=900)
+    async def get_zip_analysis(self) -> List[Dict]:
         """Analyze properties by ZIP code"""
         
-        properties = self.get_properties(limit=3000)
-        
-        if not properties:
-            return []
-        
-        df = pd.DataFrame(properties)
-        
-        # Group by ZIP code
-        zip_stats = df.groupby('zip_code').agg({
-            'appraised_value': ['mean', 'median', 'count'],
-            'square_feet': 'mean'
-        }).round(2)
-        
-        # Flatten column names
-        zip_stats.columns = ['avg_value', 'median_value', 'property_count', 'avg_sqft']
-        zip_stats = zip_stats.reset_index()
-        
-        # Filter out zips with < 10 properties
-        zip_stats = zip_stats[zip_stats['property_count'] >= 10]
-        
-        return zip_stats.to_dict('records')
+        # Group by ZIP code server-side, dropping zips with < 10 properties
+        params = {
+            "$select": (
+                "postal_code, avg(prevvalmarket) AS avg_value, median(prevvalmarket) AS median_value, "
+                "count(*) AS property_count, avg(building_square_feet) AS avg_sqft"
+            ),
+            "$where": "prevvalmarket > 0",
+            "$group": "postal_code",
+            "$having": "count(*) >= 10"
+        }
+        rows = await self._query("zip analysis", params)
+        
+        return [
+            {
+                "zip_code": row.get("postal_code", ""),
+                "avg_value": self._round(row.get("avg_value")),
+                "median_value": self._round(row.get("median_value")),
+                "property_count": int(row.get("property_count") or 0),
+                "avg_sqft": self._round(row.get("avg_sqft"))
+            }
+            for row in rows
+        ]
     
-    def get_recent_permits(self, limit: int = 50) -> List[Dict]:
+    @async_ttl_cache(maxsize=64, ttl=900)
+    async def get_recent_permits(self, limit: int = 50) -> List[Dict]:
         """Get recent building permits (shows market activity)"""
         
         url = f"{self.BASE_URL}/{self.ENDPOINTS['permits']}"
@@ -109,85 +120,107 @@ class CollinRealEstateAPI:
         }
         
         try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
+            raw_data = await http_client.get_json(url, params=params, headers=self.HEADERS)
             
-            raw_data = response.json()
-            print("RAW PERMIT DATA SAMPLE:", raw_data[:3])  # <-- ADD THIS
+            logger.debug("raw permit rows: %d", len(raw_data))
             return self._clean_permit_data(raw_data)
             
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to fetch permits: {e}")
             return []
     
+    async def _query(self, label: str, params: Dict, endpoint: str = "properties") -> List[Dict]:
+        """Run a SoQL query against a dataset, returning [] on failure"""
+        
+        url = f"{self.BASE_URL}/{self.ENDPOINTS[endpoint]}"
+        
+        try:
+            return await http_client.get_json(url, params=params, headers=self.HEADERS)
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to fetch {label}: {e}")
+            return []
+    
+    @staticmethod
+    def _round(value) -> float:
+        """Socrata returns aggregates as strings; coerce and round to cents"""
+        
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            return 0.0
+    
     def _clean_property_data(self, raw_data: List[Dict]) -> List[Dict]:
         """Clean and standardize property data"""
         
-        cleaned = []
-        
-        for prop in raw_data:
-            try:
-                cleaned_prop = {
-                    "id": prop.get("account_number", ""),
-                    "address": self._format_address(prop),
-                    "zip_code": prop.get("postal_code", ""),
-                    "appraised_value": float(prop.get("prevvalmarket") or prop.get("prevvalappraised") or 0),
-                    "land_value": float(prop.get("appraised_land_value", 0)),
-                    "building_value": float(prop.get("appraised_building_value", 0)),
-                    "property_type": prop.get("property_type_code", "Unknown"),
-                    "year_built": prop.get("year_built", ""),
-                    "square_feet": float(prop.get("building_square_feet", 0)) if prop.get("building_square_feet") else 0,
-                    "lot_size": float(prop.get("land_area_square_feet", 0)) if prop.get("land_area_square_feet") else 0
-                }
-                
-                # Only include properties with valid data
-                if cleaned_prop["appraised_value"] > 0:
-                    cleaned.append(cleaned_prop)
-                    
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Skipping invalid property data: {e}")
-                continue
-        
-        return cleaned
+        if not raw_data:
+            return []
+        
+        df = pd.DataFrame(raw_data)
+        
+        cleaned = pd.DataFrame({
+            "id": self._column(df, "account_number").fillna(""),
+            "address": self._format_addresses(df),
+            "zip_code": self._column(df, "postal_code").fillna(""),
+            "appraised_value": self._numeric(df, "prevvalmarket").fillna(
+                self._numeric(df, "prevvalappraised")
+            ).fillna(0),
+            "land_value": self._numeric(df, "appraised_land_value").fillna(0),
+            "building_value": self._numeric(df, "appraised_building_value").fillna(0),
+            "property_type": self._column(df, "property_type_code").fillna("Unknown"),
+            "year_built": self._column(df, "year_built").fillna(""),
+            "square_feet": self._numeric(df, "building_square_feet").fillna(0),
+            "lot_size": self._numeric(df, "land_area_square_feet").fillna(0)
+        })
+        
+        # Only include properties with valid data
+        cleaned = cleaned[cleaned["appraised_value"] > 0]
+        
+        return cleaned.to_dict("records")
     
     def _clean_permit_data(self, raw_data: List[Dict]) -> List[Dict]:
         """Clean building permit data"""
         
-        cleaned = []
-        
-        for permit in raw_data:
-            try:
-                cleaned_permit = {
-                    "permit_id": permit.get("permit_number", ""),
-                    "address": permit.get("original_address1", ""),
-                    "permit_type": permit.get("permit_type", ""),
-                    "work_description": permit.get("work_description", ""),
-                    "issued_date": permit.get("issued_date", ""),
-                    "estimated_cost": float(permit.get("estimated_cost", 0)) if permit.get("estimated_cost") else 0
-                }
-                
-                cleaned.append(cleaned_permit)
-                
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Skipping invalid permit data: {e}")
-                continue
-        
-        return cleaned
-    
-    def _format_address(self, prop: Dict) -> str:
-        """Format property address consistently"""
+        if not raw_data:
+            return []
         
-        address_parts = []
+        df = pd.DataFrame(raw_data)
         
-        if prop.get("property_address"):
-            address_parts.append(prop["property_address"])
+        cleaned = pd.DataFrame({
+            "permit_id": self._column(df, "permit_number").fillna(""),
+            "address": self._column(df, "original_address1").fillna(""),
+            "permit_type": self._column(df, "permit_type").fillna(""),
+            "work_description": self._column(df, "work_description").fillna(""),
+            "issued_date": self._column(df, "issued_date").fillna(""),
+            "estimated_cost": self._numeric(df, "estimated_cost").fillna(0)
+        })
         
-        address_parts.append("Austin, TX")
+        return cleaned.to_dict("records")
+    
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str) -> pd.Series:
+        """Column by name; Socrata omits null fields, so it may be missing entirely"""
+        
+        if name in df:
+            return df[name]
+        return pd.Series(None, index=df.index, dtype=object)
+    
+    def _numeric(self, df: pd.DataFrame, name: str) -> pd.Series:
+        """Column as float, with blanks and unparseable values as NaN"""
+        
+        return pd.to_numeric(self._column(df, name), errors="coerce").astype(float)
+    
+    def _format_addresses(self, df: pd.DataFrame) -> pd.Series:
+        """Format property addresses consistently"""
         
-        if prop.get("postal_code"):
-            address_parts.append(prop["postal_code"])
+        street = self._column(df, "property_address").fillna("").astype(str)
+        zip_code = self._column(df, "postal_code").fillna("").astype(str)
         
-        return ", ".join(address_parts)
+        return (
+            (street + ", ").where(street != "", "")
+            + "Austin, TX"
+            + (", " + zip_code).where(zip_code != "", "")
+        )
 
 # Global instance
 collin_api = CollinRealEstateAPI()
\ No newline at end of file
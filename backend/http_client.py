@@ -0,0 +1,70 @@
+# backend/http_client.py
+
+import asyncio
+import httpx
+import orjson
+from typing import Dict, Optional
+
+# Shared by every upstream API wrapper; created per worker in the startup hook
+_client: Optional[httpx.AsyncClient] = None
+
+# Transient upstream failures are retried with exponential backoff
+RETRY_STATUSES = frozenset({502, 503, 504})
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+
+
+async def start_client() -> None:
+    """Open the shared HTTP/2 client (called from the FastAPI startup hook)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        return
+
+    # HTTP/2 multiplexes concurrent page fetches to one Socrata host over a
+    # single connection; the limits still cap fan-out across hosts
+    _client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=25, keepalive_expiry=75),
+        timeout=30,
+        headers={"Accept-Encoding": "gzip, deflate"},
+    )
+
+
+async def close_client() -> None:
+    """Close the shared HTTP client (called from the FastAPI shutdown hook)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None or _client.is_closed:
+        raise RuntimeError("HTTP client not started; call start_client() first")
+    return _client
+
+
+async def get_json(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None):
+    """GET a JSON resource, retrying transport errors and 502/503/504 responses.
+
+    A response body that is not valid JSON raises httpx.DecodingError.
+    """
+    client = get_client()
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            resp = await client.get(url, params=params, headers=headers)
+            if resp.status_code not in RETRY_STATUSES or last_attempt:
+                resp.raise_for_status()
+                try:
+                    return orjson.loads(resp.content)
+                except orjson.JSONDecodeError as e:
+                    # e.g. an HTML maintenance page; surface it as an httpx error
+                    # so callers handling httpx.HTTPError treat it as a failed fetch
+                    raise httpx.DecodingError(f"Invalid JSON from {resp.url}: {e}", request=resp.request) from e
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+
+        await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
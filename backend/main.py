@@ -1,9 +1,23 @@
-from fastapi import FastAPI, HTTPException
+import logging
+import orjson
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from collin_api import collin_api  
-from nyc_api import nyc_api
+from nyc_api import nyc_api, VALID_BOROUGHS
+import http_client
+import workers
 
-app = FastAPI(title="Austin Real Estate Analytics API")
+# Debug output in the API wrappers (raw row counts) stays off in production
+logging.getLogger("collin_api").setLevel(logging.INFO)
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded by orjson in one C call (FastAPI's own class is deprecated)"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+app = FastAPI(title="Austin Real Estate Analytics API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,40 +27,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    await http_client.start_client()
+    workers.start_executor()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await http_client.close_client()
+    workers.shutdown_executor()
+
 @app.get("/api/properties")
 async def get_properties(limit: int = 100, zip_code: str = None):
     """Get Austin properties with optional ZIP filter"""
-    properties = collin_api.get_properties(limit=limit, zip_code=zip_code)
-    return {"properties": properties, "total": len(properties)}
+    properties = await collin_api.get_properties(limit=limit, zip_code=zip_code)
+    # Returned as a Response so FastAPI skips jsonable_encoder on thousands of rows
+    return ORJSONResponse({"properties": properties, "total": len(properties)})
 
 @app.get("/api/market-summary")
 async def get_market_summary():
     """Get market summary statistics"""
-    return collin_api.get_market_summary()
+    return await collin_api.get_market_summary()
 
 @app.get("/api/zip-analysis")
 async def get_zip_analysis():
     """Get analysis by ZIP code"""
-    return collin_api.get_zip_analysis()
+    return await collin_api.get_zip_analysis()
 
 @app.get("/api/recent-permits")
 async def get_recent_permits(limit: int = 50):
     """Get recent building permits"""
-    permits = collin_api.get_recent_permits(limit=limit)
+    permits = await collin_api.get_recent_permits(limit=limit)
     return {"permits": permits, "total": len(permits)}
 
 @app.get("/api/nyc/recent-sales")
-async def nyc_recent_sales(months: int = 12, pages: int = 5):
+async def nyc_recent_sales(months: int = 12, pages: int = Query(5, ge=1, le=10)):
     try:
-        data = nyc_api.get_recent_sales_by_borough(months=months)
+        data = await nyc_api.get_recent_sales_by_borough(months=months, pages=pages)
         return {"boroughs": data, "total": len(data)}
     except Exception as e:
         return {"error": str(e), "boroughs": [], "total": 0}
 
 @app.get("/api/nyc/neighborhoods")
 async def nyc_neighborhoods(borough: str, months: int = 12):
+    if borough not in VALID_BOROUGHS:
+        raise HTTPException(status_code=400, detail=f"Unknown borough: {borough}")
     try:
-        data = nyc_api.get_neighborhood_breakdown(borough, months)
+        data = await nyc_api.get_neighborhood_breakdown(borough, months)
         return {"neighborhoods": data, "total": len(data)}
     except Exception as e:
         return {"error": str(e), "neighborhoods": [], "total": 0}
@@ -55,4 +82,9 @@ async def nyc_neighborhoods(borough: str, months: int = 12):
 if __name__ == "__main__":
     import uvicorn, os
     port = int(os.environ.get("PORT", 8000))  # Railway will inject PORT
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    web_workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    # Workers are separate processes that import this module themselves: the TTL
+    # caches are per worker, and the HTTP client and process pool are created
+    # in each worker's startup hook
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=web_workers,
+                loop="uvloop", http="httptools")
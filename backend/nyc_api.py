@@ -1,11 +1,17 @@
 # backend/nyc_api.py
 
 import os
-import requests
+import asyncio
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from numba import njit
+from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 
+import http_client
+import workers
+from cache import async_ttl_cache
+
 BOROUGH_MAP = {
     "1": "Manhattan",
     "2": "Bronx",
@@ -14,142 +20,174 @@ BOROUGH_MAP = {
     "5": "Staten Island",
 }
 borough_map_reverse = {v: k for k, v in BOROUGH_MAP.items()}
+VALID_BOROUGHS = frozenset(borough_map_reverse)
+
+# Static SoQL fragments; only whitelisted or generated values are templated in
+_WHERE_SALES_POS = "sale_price > 0"
+_NHOOD_WHERE = {name: f"{_WHERE_SALES_POS} AND borough='{code}'" for code, name in BOROUGH_MAP.items()}
+
+# Fixed-width borough labels so sale pages can be packed into flat NumPy buffers
+_BOROUGH_DTYPE = "U16"
+
+# Sale-date cutoffs: "months" are 30-day blocks, rendered as SoQL floating timestamps
+_MONTH = timedelta(days=30)
+_SOQL_TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _filter_page(rows: List[Dict], cutoff_ts: pd.Timestamp) -> Tuple[np.ndarray, np.ndarray]:
+    """Borough names and prices of the sales in one page on/after the cutoff"""
+    df = pd.DataFrame(rows).reindex(columns=["borough", "sale_price", "sale_date"])
+    # An explicit ISO8601 format takes pandas' C parser without per-page format inference
+    sale_dt = pd.to_datetime(df["sale_date"], format="ISO8601", errors="coerce", utc=True)
+    sale_price = pd.to_numeric(df["sale_price"], errors="coerce")
+
+    # STRICT cutoff; unparseable dates/prices drop out as NaT/NaN
+    keep = (sale_dt >= cutoff_ts) & (sale_price > 0)
+    codes = df["borough"][keep].astype(str)
+    names = codes.map(BOROUGH_MAP).fillna(codes).to_numpy(dtype=_BOROUGH_DTYPE)
+    return names, sale_price[keep].to_numpy(dtype=np.float64)
+
+
+@njit(cache=True)
+def _group_stats_kernel(sorted_values: np.ndarray, bounds: np.ndarray):
+    """Per-group sum/count/median over values sorted by group; group g is bounds[g]:bounds[g + 1]"""
+    n_groups = len(bounds) - 1
+    sums = np.empty(n_groups, dtype=np.float64)
+    counts = np.empty(n_groups, dtype=np.int64)
+    medians = np.empty(n_groups, dtype=np.float64)
+
+    for g in range(n_groups):
+        chunk = sorted_values[bounds[g]:bounds[g + 1]]
+        sums[g] = chunk.sum()
+        counts[g] = len(chunk)
+        medians[g] = np.median(chunk)
+
+    return sums, counts, medians
+
+
+def _group_stats(keys: np.ndarray, values: np.ndarray, key_name: str) -> List[Dict]:
+    """Median/mean/count of `values` per distinct key, highest median first"""
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+    sums, counts, medians = _group_stats_kernel(values[order], bounds)
+    means = sums / counts
+
+    stats = [
+        {
+            key_name: str(key),
+            "median_value": round(float(medians[i]), 2),
+            "avg_value": round(float(means[i]), 2),
+            "count": int(counts[i]),
+        }
+        for i, key in enumerate(uniques)
+    ]
+    stats.sort(key=lambda r: r["median_value"], reverse=True)
+    return stats
+
 
 class NYCSalesApi:
     BASE_URL = "https://data.cityofnewyork.us/resource"
     DATASET_ID = os.getenv("NYC_SALES_DATASET_ID", "usep-8jbt")
 
+    HEADERS = {"User-Agent": "NYC-Sales-Dashboard/1.0"}
+
+    NHOOD_SELECT = (
+        "neighborhood, median(sale_price) AS median_value, "
+        "avg(sale_price) AS avg_value, count(*) AS sale_count"
+    )
+    SALES_SELECT = "borough, sale_price, sale_date"
+
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": "NYC-Sales-Dashboard/1.0"})
+        self._url = f"{self.BASE_URL}/{self.DATASET_ID}.json"
+
+    async def _fetch_rows(self, params: Dict) -> List[Dict]:
+        return await http_client.get_json(self._url, params=params, headers=self.HEADERS)
     
     
-    def get_neighborhood_breakdown(self, borough: str, months: int = 12):
-        cutoff_dt = datetime.now() - timedelta(days=30 * months)
+    @async_ttl_cache(maxsize=64, ttl=900)
+    async def get_neighborhood_breakdown(self, borough: str, months: int = 12):
+        if borough not in VALID_BOROUGHS:
+            raise ValueError(f"Unknown borough: {borough!r}")
+
+        cutoff_dt = datetime.now() - _MONTH * months
+        cutoff = cutoff_dt.strftime(_SOQL_TS_FORMAT)
 
-        url = f"{self.BASE_URL}/{self.DATASET_ID}.json"
+        # Socrata does the filtering and grouping; we get one row per neighborhood back
         params = {
-            "$select": "neighborhood, sale_price, sale_date",
-            "$where": f"sale_price > 0 AND borough='{borough_map_reverse.get(borough)}'",
-            "$limit": 20000  # neighborhoods usually smaller volume — no pagination needed here
+            "$select": self.NHOOD_SELECT,
+            "$where": f"{_NHOOD_WHERE[borough]} AND sale_date >= '{cutoff}'",
+            "$group": "neighborhood",
+            "$order": "median_value DESC",
         }
 
-        resp = self.session.get(url, params=params, timeout=30)
-        resp.raise_for_status()
-        rows = resp.json()
+        rows = await self._fetch_rows(params)
         if not rows:
             return []
 
-        filtered = []
-        for r in rows:
-            raw_date = r.get("sale_date")
-            if not raw_date:
-                continue
-            try:
-                sale_dt = datetime.fromisoformat(raw_date.replace("Z", ""))
-            except:
-                continue
-            if sale_dt < cutoff_dt:
-                continue
-
-            price_raw = r.get("sale_price")
-            if not price_raw or price_raw == "0":
-                continue
-            try:
-                price = float(price_raw)
-            except:
-                continue
-
-            nhood = r.get("neighborhood") or "Unknown"
-            filtered.append({"neighborhood": nhood, "sale_price": price})
-
-        if not filtered:
-            return []
-
-        df = pd.DataFrame(filtered)
-        agg = (
-            df.groupby("neighborhood")["sale_price"]
-            .agg(median_value="median", avg_value="mean", count="count")
-            .round(2)
-            .reset_index()
-            .sort_values("median_value", ascending=False)
-        )
-
-        return agg.to_dict("records")
+        return [
+            {
+                "neighborhood": r.get("neighborhood") or "Unknown",
+                "median_value": round(float(r.get("median_value") or 0), 2),
+                "avg_value": round(float(r.get("avg_value") or 0), 2),
+                "count": int(r.get("sale_count") or 0),
+            }
+            for r in rows
+        ]
 
 
 
-    def get_recent_sales_by_borough(self, months: int = 12, pages: int = 5) -> List[Dict]:
-        cutoff_dt = datetime.now() - timedelta(days=30 * months)
+    @async_ttl_cache(maxsize=64, ttl=900)
+    async def get_recent_sales_by_borough(self, months: int = 12, pages: int = 5) -> List[Dict]:
+        cutoff_dt = datetime.now() - _MONTH * months
+        cutoff = cutoff_dt.strftime(_SOQL_TS_FORMAT)
+        cutoff_ts = pd.Timestamp(cutoff_dt, tz="UTC")
 
-        collected = []
         step = 20000
 
-        for i in range(pages):
-            offset = i * step
-            url = f"{self.BASE_URL}/{self.DATASET_ID}.json"
+        # Columnar buffers sized for the worst case, filled page by page
+        names = np.empty(pages * step, dtype=_BOROUGH_DTYPE)
+        prices = np.empty(pages * step, dtype=np.float64)
+        n = 0
+
+        async def fetch_page(i: int) -> List[Dict]:
             params = {
-                "$select": "borough, sale_price, sale_date",
-                "$where": "sale_price > 0",
+                "$select": self.SALES_SELECT,
+                "$where": f"{_WHERE_SALES_POS} AND sale_date >= '{cutoff}'",
                 "$limit": step,
-                "$offset": offset
+                "$offset": i * step
             }
-
-            resp = self.session.get(url, params=params, timeout=30)
-            resp.raise_for_status()
-            rows = resp.json()
-            if not rows:
-                break  # no more pages
-
-            page_filtered = []
-            for r in rows:
-                raw_date = r.get("sale_date")
-                if not raw_date:
-                    continue
-                try:
-                    sale_dt = datetime.fromisoformat(raw_date.replace("Z", ""))
-                except Exception:
-                    continue
-
-                # STRICT cutoff
-                if sale_dt < cutoff_dt:
-                    continue
-
-                price_raw = r.get("sale_price")
-                if not price_raw or price_raw == "0":
-                    continue
-
-                try:
-                    price = float(price_raw)
-                except Exception:
-                    continue
-
-                code = str(r.get("borough"))
-                name = BOROUGH_MAP.get(code, code)
-                page_filtered.append({
-                    "borough": name,
-                    "sale_price": price
-                })
-
-            # CHECK-ALL rule: if entire page had no valid rows, we stop
-            if not page_filtered:
-                break
-
-            collected.extend(page_filtered)
-
-        if not collected:
+            return await self._fetch_rows(params)
+
+        # All pages are requested at once and consumed in offset order; once a
+        # page ends the scan, fetches for later pages are cancelled
+        tasks = [asyncio.create_task(fetch_page(i)) for i in range(pages)]
+        try:
+            for task in tasks:
+                rows = await task
+                if not rows:
+                    break  # no more pages
+
+                page_names, page_prices = await workers.run_cpu(_filter_page, rows, cutoff_ts)
+
+                # CHECK-ALL rule: if entire page had no valid rows, we stop
+                if not len(page_prices):
+                    break
+
+                end = n + len(page_prices)
+                names[n:end] = page_names
+                prices[n:end] = page_prices
+                n = end
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if not n:
             return []
 
-        df = pd.DataFrame(collected)
-        agg = (
-            df.groupby("borough")["sale_price"]
-            .agg(median_value="median", avg_value="mean", count="count")
-            .round(2)
-            .reset_index()
-            .sort_values("median_value", ascending=False)
-        )
-
-        result = agg.to_dict("records")
+        result = await workers.run_cpu(_group_stats, names[:n], prices[:n], "borough")
         if result:
             result[0]["last_updated"] = datetime.now().isoformat()
         return result
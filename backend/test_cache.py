@@ -0,0 +1,36 @@
+import asyncio
+
+import collin_api
+from cache import async_ttl_cache
+
+
+def test_concurrent_misses_share_one_call():
+    calls = []
+
+    @async_ttl_cache(ttl=60)
+    async def fetch(limit: int = 100):
+        calls.append(limit)
+        await asyncio.sleep(0.01)
+        return [limit]
+
+    async def run():
+        return await asyncio.gather(fetch(), fetch(limit=100), fetch(100), fetch(5))
+
+    assert asyncio.run(run()) == [[100], [100], [100], [5]]
+    assert calls == [100, 5]
+
+
+def test_failed_market_summary_is_not_cached(monkeypatch):
+    api = collin_api.CollinRealEstateAPI()
+    responses = [[], [{"n": "2", "avg_value": "150", "median_value": "150",
+                       "min_value": "100", "max_value": "200"}]]
+
+    async def fake_query(label, params, endpoint="properties"):
+        return responses.pop(0)
+
+    monkeypatch.setattr(api, "_query", fake_query)
+
+    assert asyncio.run(api.get_market_summary()) == {"error": "No data available"}
+    summary = asyncio.run(api.get_market_summary())
+    assert summary["total_properties"] == 2
+    assert summary["average_value"] == 150.0
@@ -0,0 +1,29 @@
+import asyncio
+
+import httpx
+import pytest
+
+import collin_api
+import http_client
+
+
+def _serve(handler):
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def teardown_function():
+    asyncio.run(http_client.close_client())
+
+
+def test_non_json_body_raises_decoding_error():
+    _serve(lambda request: httpx.Response(200, text="<html>Down for maintenance</html>"))
+
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(http_client.get_json("https://example.test/rows.json"))
+
+
+def test_non_json_body_is_a_failed_fetch_for_collin_api():
+    _serve(lambda request: httpx.Response(200, text="<html>Down for maintenance</html>"))
+
+    api = collin_api.CollinRealEstateAPI()
+    assert asyncio.run(api.get_recent_permits(limit=5)) == []
@@ -0,0 +1,36 @@
+# backend/workers.py
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+# CPU-bound pandas/NumPy work runs here so it never blocks the event loop
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def start_executor() -> None:
+    """Create the process pool (called from the FastAPI startup hook)"""
+    global _executor
+    if _executor is None:
+        # Split the cores between uvicorn workers rather than giving each a full set
+        web_workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+        _executor = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) // web_workers))
+
+
+def shutdown_executor() -> None:
+    """Tear down the process pool (called from the FastAPI shutdown hook)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def run_cpu(func: Callable, *args):
+    """Run a picklable function off the event loop.
+
+    Falls back to the loop's default thread pool when the process pool has
+    not been started (e.g. when the API wrappers are used outside FastAPI).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)